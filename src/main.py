@@ -3,22 +3,34 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import concurrent.futures
+import functools
 import logging
 import os
 from pathlib import Path
-from typing import Literal
+from typing import Callable
 
+import numpy as np
 from farm_ng.canbus.canbus_pb2 import Twist2d
-from farm_ng.canbus.packet import AmigaTpdo1
+from farm_ng.canbus.packet import AmigaControlState
 from farm_ng.core.event_client import EventClient
 from farm_ng.core.event_service_pb2 import EventServiceConfig
 from farm_ng.core.event_service_pb2 import EventServiceConfigList
 from farm_ng.core.event_service_pb2 import SubscribeRequest
 from farm_ng.core.events_file_reader import payload_to_protobuf
 from farm_ng.core.events_file_reader import proto_from_json_file
+from google.protobuf.message import DecodeError
+from google.protobuf.message import Message
+from turbojpeg import TJPF_GRAY
 from turbojpeg import TurboJPEG
 from virtual_joystick.joystick import VirtualJoystickWidget
 
+# Optional hardware JPEG decoder, available on CUDA capable brains
+try:
+    from nvjpeg import NvJpeg
+except ImportError:
+    NvJpeg = None
+
 # Must come before kivy imports
 os.environ["KIVY_NO_ARGS"] = "1"
 
@@ -41,9 +53,70 @@ from kivy.properties import StringProperty  # noqa: E402
 
 logger = logging.getLogger("amiga.apps.camera")
 
+# Read the app layout once at import, keeping the disk read off the App startup path
+_KV_TEXT = (Path(__file__).with_name("res") / "main.kv").read_text()
+
 MAX_LINEAR_VELOCITY_MPS = 0.5
 MAX_ANGULAR_VELOCITY_RPS = 0.5
 VELOCITY_INCREMENT = 0.05
+JOYSTICK_DEADBAND = 0.05
+# Unchanged twist commands are only re-sent every HEARTBEAT_TICKS publish periods
+TWIST_EPSILON = 1e-4
+HEARTBEAT_TICKS = 10
+
+# Streams from the mono cameras, decoded as luminance only (1 byte per pixel instead of 3)
+GRAYSCALE_STREAMS = {"left", "right"}
+
+
+def load_service_configs(config_path: Path) -> EventServiceConfigList:
+    """Loads the service config list, reusing a binary sidecar while the JSON file is unchanged."""
+    config_path = Path(config_path)
+    sidecar = config_path.with_suffix(".pb")
+    sidecar_mtime = config_path.with_suffix(".pb.mtime")
+    mtime_key = str(config_path.stat().st_mtime_ns)
+
+    try:
+        if sidecar_mtime.read_text() == mtime_key:
+            config_list = EventServiceConfigList()
+            config_list.ParseFromString(sidecar.read_bytes())
+            return config_list
+    except (OSError, DecodeError):
+        pass
+
+    config_list = proto_from_json_file(config_path, EventServiceConfigList())
+    try:
+        sidecar.write_bytes(config_list.SerializeToString())
+        sidecar_mtime.write_text(mtime_key)
+    except OSError as e:
+        logger.debug(f"Could not cache service config next to {config_path}: {e}")
+    return config_list
+
+
+def create_image_decoder():
+    """Returns the nvjpeg decoder when a CUDA device is usable, falling back to TurboJPEG on the CPU.
+
+    Both decoders expose ``decode(data) -> np.ndarray``.
+    """
+    if NvJpeg is not None:
+        try:
+            decoder = NvJpeg()
+            logger.info("Decoding camera images with nvjpeg")
+            return decoder
+        except Exception as e:
+            logger.warning(f"nvjpeg unavailable, falling back to TurboJPEG: {e}")
+    return TurboJPEG()
+
+
+def compute_twist(jy: float, jx: float, max_speed: float, max_angular_rate: float) -> tuple[float, float]:
+    """Maps a joystick pose onto a (linear, angular) velocity command, with deadband and clamping."""
+    if -JOYSTICK_DEADBAND < jy < JOYSTICK_DEADBAND:
+        jy = 0.0
+    if -JOYSTICK_DEADBAND < jx < JOYSTICK_DEADBAND:
+        jx = 0.0
+
+    vx = min(max(max_speed * jy, -MAX_LINEAR_VELOCITY_MPS), MAX_LINEAR_VELOCITY_MPS)
+    wz = min(max(max_angular_rate * -jx, -MAX_ANGULAR_VELOCITY_RPS), MAX_ANGULAR_VELOCITY_RPS)
+    return vx, wz
 
 
 class KivyVirtualJoystick(App):
@@ -67,111 +140,168 @@ class KivyVirtualJoystick(App):
 
         self.async_tasks: list[asyncio.Task] = []
 
-        self.image_decoder = TurboJPEG()
+        self.image_decoder = create_image_decoder()
+
+        # Decode runs on worker threads to keep it off the event loop. TurboJPEG opens a fresh handle
+        # per decode call and can be shared; the single nvjpeg handle is kept to one thread, since a
+        # cancelled stream's decode may still be running when the next stream submits its own.
+        decode_workers = 2 if isinstance(self.image_decoder, TurboJPEG) else 1
+        self._decode_pool = concurrent.futures.ThreadPoolExecutor(max_workers=decode_workers)
 
         self.view_name = "rgb"
 
+        # Set when the active tab changes, so the camera task resubscribes to the new stream
+        self._view_changed: asyncio.Event | None = None
+
+        # One persistent GL texture per stream, re-created only when the frame size changes
+        self._textures: dict[str, Texture] = {}
+
+        # Protobuf parsers keyed by event uri path, resolved once per subscription
+        self._decoders: dict[str, Callable[[bytes], Message]] = {}
+
+        # Names of the control states, so the canbus loop can skip building AmigaTpdo1 wrappers
+        self._state_names: dict[int, str] = {state.value: state.name for state in AmigaControlState}
+
+        # Last twist command sent on the bus and the number of publish ticks skipped since
+        self._last_twist: tuple[float, float] | None = None
+        self._heartbeat: int = 0
+
+        # Most recent control state name reported by the canbus service
+        self._latest_state: str = "???"
+
         self.max_speed: float = 1.0
         self.max_angular_rate: float = 1.0
 
     def build(self):
-        return Builder.load_file("res/main.kv")
+        return Builder.load_string(_KV_TEXT)
 
     def on_exit_btn(self) -> None:
         """Kills the running kivy application."""
-        for task in self.tasks:
+        for task in self.async_tasks:
             task.cancel()
         App.get_running_app().stop()
 
     def update_view(self, view_name: str):
+        if view_name not in self.STREAM_NAMES or view_name == self.view_name:
+            return
         self.view_name = view_name
+        if self._view_changed is not None:
+            self._view_changed.set()
 
     async def app_func(self):
         async def run_wrapper() -> None:
             # we don't actually need to set asyncio as the lib because it is
             # the default, but it doesn't hurt to be explicit
             await self.async_run(async_lib="asyncio")
+            # stop the camera and canbus tasks before the decode pool goes away
             for task in self.async_tasks:
                 task.cancel()
+            self._decode_pool.shutdown(wait=False)
 
-        config_list = proto_from_json_file(
-            self.service_config, EventServiceConfigList()
-        )
+        config_list = load_service_configs(self.service_config)
 
-        oak0_client: EventClient | None = None
-        canbus_client: EventClient | None = None
+        configs_by_name: dict[str, EventServiceConfig] = {c.name: c for c in config_list.configs}
+        oak0_config = configs_by_name.get("oak0")
+        canbus_config = configs_by_name.get("canbus")
 
-        for config in config_list.configs:
-            if config.name == "oak0":
-                oak0_client = EventClient(config)
-            elif config.name == "canbus":
-                canbus_client = EventClient(config)
-
-        # Confirm that EventClients were created for all required services
-        if None in [oak0_client, canbus_client]:
+        # Confirm that configs were found for all required services
+        if None in [oak0_config, canbus_config]:
             raise RuntimeError(f"Did not find Oak0 and CAN BUS clients in {self.service_config}")
 
+        oak0_client = EventClient(oak0_config)
+        canbus_client = EventClient(canbus_config)
+
+        self._view_changed = asyncio.Event()
+
         # Camera task
-        self.tasks: list[asyncio.Task] = [
-            asyncio.create_task(self.stream_camera(oak0_client, view_name))
-            for view_name in self.STREAM_NAMES
-        ]
+        self.async_tasks = [asyncio.create_task(self.stream_camera(oak0_client, self._view_changed))]
 
-        self.tasks.append(asyncio.create_task(self.pose_generator(canbus_client)))
+        self.async_tasks.append(asyncio.create_task(self.stream_canbus_state(canbus_client)))
+        self.async_tasks.append(asyncio.create_task(self.pose_generator(canbus_client)))
 
-        return await asyncio.gather(run_wrapper(), *self.tasks)
+        return await asyncio.gather(run_wrapper(), *self.async_tasks)
 
-    async def stream_camera(
-        self,
-        oak_client: EventClient,
-        view_name: Literal["rgb", "disparity", "left", "right"] = "rgb",
-    ) -> None:
+    def decode_payload(self, event, payload: bytes) -> Message:
+        """Decodes an event payload, resolving the protobuf type only on the first event of each path."""
+        decoder = self._decoders.get(event.uri.path)
+        if decoder is None:
+            message = payload_to_protobuf(event, payload)
+            self._decoders[event.uri.path] = type(message).FromString
+            return message
+        return decoder(payload)
 
-        """Subscribes to the camera service and populates the tabbed panel with all 4 image streams."""
+    async def stream_camera(self, oak_client: EventClient, view_changed: asyncio.Event) -> None:
+        """Streams the camera view of the active tab, resubscribing whenever the tab changes."""
         while self.root is None:
             await asyncio.sleep(0.01)
 
+        while True:
+            view_changed.clear()
+            stream_task = asyncio.create_task(self.stream_view(oak_client, self.view_name))
+            view_task = asyncio.create_task(view_changed.wait())
+            try:
+                done, _ = await asyncio.wait([stream_task, view_task], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stream_task.cancel()
+                view_task.cancel()
+
+            # Surface subscription errors instead of silently resubscribing
+            if stream_task in done and not stream_task.cancelled():
+                stream_task.result()
+
+    async def stream_view(
+        self,
+        oak_client: EventClient,
+        view_name: str = "rgb",
+    ) -> None:
+        """Subscribes to a single camera stream and populates its tab with the images."""
         rate = oak_client.config.subscriptions[0].every_n
         uri = {"path": f"{oak_client.config.name}/{view_name}"}
 
+        # TurboJPEG can decode just the Y plane, skipping chroma upsampling and color conversion.
+        # The (h, w, 1) result has tightly packed w-byte rows; blit_buffer picks GL_UNPACK_ALIGNMENT
+        # from the pixel width, which always divides w here, so odd widths upload correctly.
+        decode = self.image_decoder.decode
+        colorfmt = "rgb"
+        if view_name in GRAYSCALE_STREAMS and isinstance(self.image_decoder, TurboJPEG):
+            decode = functools.partial(self.image_decoder.decode, pixel_format=TJPF_GRAY)
+            colorfmt = "luminance"
+
         async for event, payload in oak_client.subscribe(
             SubscribeRequest(uri=uri, every_n=rate),
             decode=False,
         ):
-
-            self.view_name = self.root.ids["tab_root"].current_tab.text
-
-            if view_name == self.view_name:
-                message = payload_to_protobuf(event, payload)
-                try:
-                    img = self.image_decoder.decode(message.image_data)
-                except Exception as e:
-                    logger.exception(f"Error decoding image: {e}")
-                    continue
-
-                # create the opengl texture and set it to the image
-                texture = Texture.create(
-                    size=(img.shape[1], img.shape[0]), icolorfmt="rgb"
+            message = self.decode_payload(event, payload)
+            try:
+                img = await asyncio.get_running_loop().run_in_executor(
+                    self._decode_pool, decode, message.image_data
                 )
+            except Exception as e:
+                logger.exception(f"Error decoding image: {e}")
+                continue
+
+            # reuse the opengl texture for this stream and blit the new image into it
+            size = (img.shape[1], img.shape[0])
+            texture = self._textures.get(view_name)
+            if texture is None or texture.size != size:
+                texture = Texture.create(size=size, colorfmt=colorfmt)
                 texture.flip_vertical()
-                texture.blit_buffer(
-                    bytes(img.data),
-                    colorfmt="rgb",
-                    bufferfmt="ubyte",
-                    mipmap_generation=False,
-                )
+                self._textures[view_name] = texture
                 self.root.ids[view_name].texture = texture
 
-    async def pose_generator(self, canbus_client: EventClient, period: float = 0.02):
-        """The pose generator yields an AmigaRpdo1 (auto control command) for the canbus client to send on the bus
-        at the specified period (recommended 50hz) based on the onscreen joystick position."""
-        while self.root is None:
-            await asyncio.sleep(0.01)
-
-        twist = Twist2d()
-
-        joystick: VirtualJoystickWidget = self.root.ids["joystick"]
-
+            # Kivy reads non-bytes buffers through a 1-D memoryview, so pass a flat view of the image;
+            # ascontiguousarray and reshape only copy when the decoder returned a strided array
+            texture.blit_buffer(
+                np.ascontiguousarray(img).reshape(-1),
+                colorfmt=colorfmt,
+                bufferfmt="ubyte",
+                mipmap_generation=False,
+            )
+            # the texture object is unchanged, so tell the Image widget to redraw it
+            self.root.ids[view_name].canvas.ask_update()
+
+    async def stream_canbus_state(self, canbus_client: EventClient) -> None:
+        """Subscribes to the canbus service state and keeps the latest Amiga control state."""
         rate = canbus_client.config.subscriptions[0].every_n
         uri = {"path": f"{canbus_client.config.name}/state"}
 
@@ -179,18 +309,54 @@ class KivyVirtualJoystick(App):
             SubscribeRequest(uri=uri, every_n=rate),
             decode=False,
         ):
-            message = payload_to_protobuf(event, payload)
-            tpdo1 = AmigaTpdo1.from_proto(message.amiga_tpdo1)
+            message = self.decode_payload(event, payload)
+            self._latest_state = self._state_names.get(message.amiga_tpdo1.control_state, "???")
 
-            twist.linear_velocity_x = self.max_speed * joystick.joystick_pose.y
-            twist.angular_velocity = self.max_angular_rate * -joystick.joystick_pose.x
+    async def pose_generator(self, canbus_client: EventClient, period: float = 0.02):
+        """The pose generator yields an AmigaRpdo1 (auto control command) for the canbus client to send on the bus
+        at the specified period (recommended 50hz) based on the onscreen joystick position."""
+        while self.root is None:
+            await asyncio.sleep(0.01)
+
+        twist = Twist2d()
 
-            self.amiga_state = tpdo1.state.name
-            self.amiga_speed = "{:.4f}".format(twist.linear_velocity_x)
-            self.amiga_rate = "{:.4f}".format(twist.angular_velocity)
+        joystick: VirtualJoystickWidget = self.root.ids["joystick"]
 
-            await canbus_client.request_reply("/twist", twist)
-            await asyncio.sleep(period)
+        loop = asyncio.get_running_loop()
+        next_t = loop.time()
+
+        while True:
+            vx, wz = compute_twist(
+                joystick.joystick_pose.y, joystick.joystick_pose.x, self.max_speed, self.max_angular_rate
+            )
+            twist.linear_velocity_x = vx
+            twist.angular_velocity = wz
+
+            # Kivy properties only dispatch when the assigned value differs from the current one
+            self.amiga_state = self._latest_state
+            self.amiga_speed = f"{twist.linear_velocity_x:.4f}"
+            self.amiga_rate = f"{twist.angular_velocity:.4f}"
+
+            # Skip publishing an unchanged command, but still send a heartbeat for safety
+            last = self._last_twist
+            if (
+                last is not None
+                and abs(vx - last[0]) < TWIST_EPSILON
+                and abs(wz - last[1]) < TWIST_EPSILON
+                and self._heartbeat < HEARTBEAT_TICKS - 1
+            ):
+                self._heartbeat += 1
+            else:
+                self._last_twist = (vx, wz)
+                self._heartbeat = 0
+                await canbus_client.request_reply("/twist", twist)
+
+            # Publish on a fixed deadline, dropping ticks we are already too late for
+            next_t += period
+            now = loop.time()
+            if next_t < now:
+                next_t = now
+            await asyncio.sleep(next_t - now)
 
 
 if __name__ == "__main__":
@@ -201,10 +367,15 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    loop = asyncio.get_event_loop()
+    # uvloop is optional, the default asyncio loop is used when it is not installed
+    try:
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
 
     try:
-        loop.run_until_complete(KivyVirtualJoystick(args.service_config).app_func())
+        asyncio.run(KivyVirtualJoystick(args.service_config).app_func())
     except asyncio.CancelledError:
         pass
-    loop.close()
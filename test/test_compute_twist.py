@@ -0,0 +1,56 @@
+"""Tests for the joystick pose to twist command mapping."""
+import main
+import pytest
+from main import JOYSTICK_DEADBAND
+from main import MAX_ANGULAR_VELOCITY_RPS
+from main import MAX_LINEAR_VELOCITY_MPS
+
+
+class TestComputeTwist:
+    """Tests for ``compute_twist``."""
+
+    @pytest.mark.parametrize(
+        "jy,expected_vx",
+        [
+            (JOYSTICK_DEADBAND - 0.001, 0.0),
+            (-(JOYSTICK_DEADBAND - 0.001), 0.0),
+            (JOYSTICK_DEADBAND + 0.001, JOYSTICK_DEADBAND + 0.001),
+            (-(JOYSTICK_DEADBAND + 0.001), -(JOYSTICK_DEADBAND + 0.001)),
+        ],
+    )
+    def test_linear_deadband(self, jy, expected_vx) -> None:
+        vx, wz = main.compute_twist(jy, 0.0, 1.0, 1.0)
+        assert vx == pytest.approx(expected_vx)
+        assert wz == 0.0
+
+    @pytest.mark.parametrize(
+        "jx,expected_wz",
+        [
+            (JOYSTICK_DEADBAND - 0.001, 0.0),
+            (-(JOYSTICK_DEADBAND - 0.001), 0.0),
+            (JOYSTICK_DEADBAND + 0.001, -(JOYSTICK_DEADBAND + 0.001)),
+            (-(JOYSTICK_DEADBAND + 0.001), JOYSTICK_DEADBAND + 0.001),
+        ],
+    )
+    def test_angular_deadband(self, jx, expected_wz) -> None:
+        vx, wz = main.compute_twist(0.0, jx, 1.0, 1.0)
+        assert vx == 0.0
+        assert wz == pytest.approx(expected_wz)
+
+    @pytest.mark.parametrize(
+        "jy,jx,expected",
+        [
+            (1.0, 0.0, (MAX_LINEAR_VELOCITY_MPS, 0.0)),
+            (-1.0, 0.0, (-MAX_LINEAR_VELOCITY_MPS, 0.0)),
+            (0.0, 1.0, (0.0, -MAX_ANGULAR_VELOCITY_RPS)),
+            (0.0, -1.0, (0.0, MAX_ANGULAR_VELOCITY_RPS)),
+            (1.0, -1.0, (MAX_LINEAR_VELOCITY_MPS, MAX_ANGULAR_VELOCITY_RPS)),
+        ],
+    )
+    def test_clamps_to_max_velocity(self, jy, jx, expected) -> None:
+        assert main.compute_twist(jy, jx, 1.0, 1.0) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("jx", [0.2, -0.2, 0.4])
+    def test_angular_sign_flip(self, jx) -> None:
+        _, wz = main.compute_twist(0.0, jx, 1.0, 1.0)
+        assert wz == pytest.approx(-jx)
@@ -0,0 +1,63 @@
+"""Tests for the cached service config loading in the app entry point."""
+import json
+import os
+from pathlib import Path
+
+import main
+import pytest
+
+
+def write_config(path: Path, port: int) -> None:
+    config = {"configs": [{"name": "canbus", "port": port, "host": "localhost"}]}
+    path.write_text(json.dumps(config))
+
+
+def bump_mtime(path: Path) -> None:
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestLoadServiceConfigs:
+    """Tests for ``load_service_configs`` and its binary sidecar."""
+
+    @pytest.fixture
+    def config_path(self, tmp_path: Path) -> Path:
+        path = tmp_path / "service_config.json"
+        write_config(path, port=6001)
+        return path
+
+    def test_writes_sidecar(self, config_path: Path) -> None:
+        config_list = main.load_service_configs(config_path)
+        assert config_list.configs[0].port == 6001
+        assert config_path.with_suffix(".pb").exists()
+        assert config_path.with_suffix(".pb.mtime").read_text() == str(config_path.stat().st_mtime_ns)
+
+    def test_cache_hit_skips_json(self, config_path: Path, monkeypatch) -> None:
+        main.load_service_configs(config_path)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("JSON config should not be parsed on a cache hit")
+
+        monkeypatch.setattr(main, "proto_from_json_file", fail)
+        config_list = main.load_service_configs(config_path)
+        assert config_list.configs[0].port == 6001
+
+    def test_json_change_invalidates_cache(self, config_path: Path) -> None:
+        main.load_service_configs(config_path)
+
+        write_config(config_path, port=7001)
+        bump_mtime(config_path)
+        assert main.load_service_configs(config_path).configs[0].port == 7001
+
+    def test_corrupt_sidecar_falls_back_to_json(self, config_path: Path, monkeypatch) -> None:
+        main.load_service_configs(config_path)
+
+        config_path.with_suffix(".pb").write_bytes(b"\x0a\xff")
+        assert main.load_service_configs(config_path).configs[0].port == 6001
+
+        def fail(*args, **kwargs):
+            raise AssertionError("JSON config should not be parsed once the sidecar is rewritten")
+
+        # the sidecar is rewritten from the JSON config and used on the next load
+        monkeypatch.setattr(main, "proto_from_json_file", fail)
+        assert main.load_service_configs(config_path).configs[0].port == 6001